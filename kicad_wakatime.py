@@ -2,17 +2,16 @@
 import os
 import time
 import subprocess
+import json
+import queue
 import configparser
 import platform
 import re
-import glob
 from pathlib import Path
 import logging
-import psutil
 import argparse
 import sys
-from threading import Thread, Lock
-from datetime import datetime
+from threading import Thread, Event, Timer
 
 # Add pynput for mouse and keyboard tracking
 try:
@@ -21,16 +20,162 @@ try:
 except ImportError:
     ACTIVITY_TRACKING_AVAILABLE = False
     
+# WakaTime paths, resolved once
+_HOME = Path.home()
+_WAKATIME_DIR = _HOME / '.wakatime'
+_WAKATIME_CFG = _HOME / '.wakatime.cfg'
+_LOG_PATH = _WAKATIME_DIR / 'kicad-wakatime.log'
+
+# Resolved once; the platform cannot change while running
+_IS_WINDOWS = platform.system() == 'Windows'
+
+# Win32 API used to inspect and listen for the foreground window
+if _IS_WINDOWS:
+    import ctypes
+    from ctypes import wintypes
+    from win32 import win32gui, win32process
+
+    _get_foreground_window = win32gui.GetForegroundWindow
+    _get_window_text = win32gui.GetWindowText
+    _get_window_thread_process_id = win32process.GetWindowThreadProcessId
+
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    EVENT_OBJECT_NAMECHANGE = 0x800C
+    OBJID_WINDOW = 0
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WM_QUIT = 0x0012
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+    WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                      wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+    # Private handles so the prototypes below do not leak into ctypes.windll
+    _user32 = ctypes.WinDLL('user32', use_last_error=True)
+    _user32.SetWinEventHook.restype = wintypes.HANDLE
+    _user32.SetWinEventHook.argtypes = [wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WinEventProc,
+                                        wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+    _user32.UnhookWinEvent.restype = wintypes.BOOL
+    _user32.UnhookWinEvent.argtypes = [wintypes.HANDLE]
+    _user32.GetMessageW.restype = wintypes.BOOL
+    _user32.GetMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT]
+    _user32.TranslateMessage.argtypes = [ctypes.POINTER(wintypes.MSG)]
+    _user32.DispatchMessageW.argtypes = [ctypes.POINTER(wintypes.MSG)]
+    _user32.PostThreadMessageW.restype = wintypes.BOOL
+    _user32.PostThreadMessageW.argtypes = [wintypes.DWORD, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+
+    _kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    _kernel32.OpenProcess.restype = wintypes.HANDLE
+    _kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    _kernel32.QueryFullProcessImageNameW.restype = wintypes.BOOL
+    _kernel32.QueryFullProcessImageNameW.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.LPWSTR,
+                                                     ctypes.POINTER(wintypes.DWORD)]
+    _kernel32.CloseHandle.restype = wintypes.BOOL
+    _kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    _kernel32.GetCurrentThreadId.restype = wintypes.DWORD
+    _kernel32.GetCurrentThreadId.argtypes = []
+
+    def _exe_name(pid: int):
+        """Return the executable file name of pid via QueryFullProcessImageNameW, or None on failure"""
+        handle = _kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return None
+        try:
+            buf = ctypes.create_unicode_buffer(1024)
+            size = wintypes.DWORD(len(buf))
+            if not _kernel32.QueryFullProcessImageNameW(handle, 0, buf, ctypes.byref(size)):
+                return None
+            return os.path.basename(buf.value)
+        finally:
+            _kernel32.CloseHandle(handle)
+
+# Interval used when foreground change notifications are unavailable
+POLL_INTERVAL = 5  # seconds
+
+# How long log records may sit in the log file buffer before being written
+LOG_FLUSH_INTERVAL = 5  # seconds
+LOG_BUFFER_SIZE = 64 * 1024  # bytes
+
+# Minimum time between activity updates from mouse movement
+MOVE_THROTTLE_INTERVAL = 0.5  # seconds
+
+# Minimum time between searches for kicad.json when it could not be found
+KICAD_CONFIG_RETRY_INTERVAL = 30  # seconds
+
+# Maximum number of (pid, window) -> executable name entries kept between polls
+PID_NAME_CACHE_SIZE = 64
+    
 # Setup logging will be initialized later after parsing command line arguments
 logger = logging.getLogger('kicad-wakatime')
 
+class BufferedFileHandler(logging.FileHandler):
+    """FileHandler that batches writes instead of flushing the file after every record"""
+    def __init__(self, filename, **kwargs):
+        self._flush_timer = None
+        super().__init__(filename, **kwargs)
+    
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=LOG_BUFFER_SIZE,
+                    encoding=self.encoding, errors=self.errors)
+    
+    def emit(self, record):
+        """Write the record into the buffer; errors are written out immediately"""
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+            return
+        
+        if record.levelno >= logging.ERROR:
+            self.flush()
+        elif self._flush_timer is None:
+            # One-shot timer, only armed while something is buffered
+            self._flush_timer = Timer(LOG_FLUSH_INTERVAL, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def flush(self):
+        self.acquire()
+        try:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            super().flush()
+        finally:
+            self.release()
+
+# Window title patterns, compiled once instead of on every poll
+# Old format: "{file name}.{ext} [*] - {editor}"
+_OLD_FORMAT_RE = re.compile(r'([^\s/\\]+\.(?:kicad_pcb|sch|kicad_sch|kicad_pro))(?:\s+-\s+|\s+\[\*\]\s+-\s+)')
+# New format: "{if unsaved: * else ""} {project name} — {editor type}"
+_NEW_FORMAT_RE = re.compile(r'(\*?)([^\s—]+)\s+—\s+(.+)')
+
+# Substrings identifying KiCad by window title or executable name
+_KICAD_TITLE_KEYS = ('KiCad', 'PCB Editor', 'Eeschema', 'Schematic Editor', 'PCBNew', 'Symbol Editor', 'Footprint Editor')
+_KICAD_EXE_KEYS = ('kicad', 'pcbnew', 'eeschema', 'pcb_editor', 'sch_editor')
+
+# Editor type (from the new title format) to file extension, checked in order
+_EXT_MAP = (
+    ('PCB Editor', '.kicad_pcb'),
+    ('Schematic Editor', '.kicad_sch'),
+    ('KiCad', '.kicad_pro'),
+    ('Symbol Editor', '.kicad_sym'),
+    ('Footprint Editor', '.kicad_mod'),
+)
+# Editors whose file path is only a guess based on the project name
+_APPROX_PATH_EDITORS = ('Symbol Editor', 'Footprint Editor')
+
 class UserActivityTracker:
     def __init__(self, inactivity_threshold=60):
-        self.last_activity_time = time.time()
+        # Written by the pynput listener threads; a single float store is atomic so no lock is needed
+        self.last_activity_time = time.monotonic()
         self.inactivity_threshold = inactivity_threshold
-        self.is_active = True
-        self.lock = Lock()
+        self.reported_inactive = False
         self.tracking_enabled = ACTIVITY_TRACKING_AVAILABLE
+        self.listening = False
         
         if not self.tracking_enabled:
             logger.warning("Activity tracking not available: pynput module not found")
@@ -38,8 +183,16 @@ class UserActivityTracker:
             logger.warning("Running without activity tracking")
             return
             
-        # Start listeners in separate threads
-        self.mouse_listener = mouse.Listener(on_move=self.on_activity, 
+        self.start()
+        logger.info("User activity tracking started")
+    
+    def start(self):
+        """Install the global input listeners if they are not already running"""
+        if not self.tracking_enabled or self.listening:
+            return
+        
+        # pynput listeners are threads and cannot be restarted, so create new ones each time
+        self.mouse_listener = mouse.Listener(on_move=self.on_move, 
                                            on_click=self.on_activity, 
                                            on_scroll=self.on_activity)
         self.keyboard_listener = keyboard.Listener(on_press=self.on_activity)
@@ -47,17 +200,25 @@ class UserActivityTracker:
         self.mouse_listener.daemon = True
         self.keyboard_listener.daemon = True
         
+        # Input was not observed while detached; switching back to KiCad counts as activity
+        self.last_activity_time = time.monotonic()
+        
         self.mouse_listener.start()
         self.keyboard_listener.start()
+        self.listening = True
         
-        logger.info("User activity tracking started")
+        logger.debug("User activity listeners started")
         
     def on_activity(self, *args, **kwargs):
         """Callback for any mouse or keyboard activity"""
         # logger.debug("User activity detected")
-        with self.lock:
-            self.last_activity_time = time.time()
-            self.is_active = True
+        self.last_activity_time = time.monotonic()
+    
+    def on_move(self, *args, **kwargs):
+        """Callback for mouse movement, which fires for every pixel moved, so updates are throttled"""
+        now = time.monotonic()
+        if now - self.last_activity_time >= MOVE_THROTTLE_INTERVAL:
+            self.last_activity_time = now
     
     def check_activity(self):
         """Check if user is currently active based on recent input"""
@@ -65,42 +226,151 @@ class UserActivityTracker:
             logger.warning("Activity tracking not enabled, assuming user is active")
             return True  # Assume active if tracking not available
             
-        with self.lock:
-            current_time = time.time()
-            time_since_activity = current_time - self.last_activity_time
+        now = time.monotonic()
+        time_since_activity = now - self.last_activity_time
 
-            # logger.debug(f"Time since last activity: {time_since_activity:.1f} seconds")
+        # logger.debug(f"Time since last activity: {time_since_activity:.1f} seconds")
 
-            logger.debug(f"User has been inactive for {time_since_activity:.1f} seconds out of threshold {self.inactivity_threshold} seconds")
-            
-            # Update active status if we've exceeded the threshold
-            if time_since_activity > self.inactivity_threshold:
-                if self.is_active:
-                    logger.info(f"User inactive for {time_since_activity:.1f} seconds, threshold is {self.inactivity_threshold} seconds")
-                self.is_active = False
-            
-            return self.is_active
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("User has been inactive for %.1f seconds out of threshold %d seconds",
+                         time_since_activity, self.inactivity_threshold)
+        
+        is_active = time_since_activity <= self.inactivity_threshold
+        
+        # Only log the transition to inactive once
+        if not is_active and not self.reported_inactive:
+            logger.info(f"User inactive for {time_since_activity:.1f} seconds, threshold is {self.inactivity_threshold} seconds")
+        self.reported_inactive = not is_active
+        
+        return is_active
     
     def get_time_since_activity(self):
         """Return seconds since last activity"""
         if not self.tracking_enabled:
             return 0  # Assume just active if tracking not available
             
-        with self.lock:
-            return time.time() - self.last_activity_time
+        return time.monotonic() - self.last_activity_time
             
     def stop(self):
         """Stop the activity tracking"""
-        if self.tracking_enabled:
+        if self.tracking_enabled and self.listening:
             self.mouse_listener.stop()
             self.keyboard_listener.stop()
-            logger.info("User activity tracking stopped")
+            self.listening = False
+            logger.debug("User activity listeners stopped")
+
+class ForegroundWindowWatcher:
+    """Wakes the main loop when the Windows foreground window or its title changes instead of polling"""
+    def __init__(self):
+        self.changed = Event()
+        self.running = False
+        self._thread_id = None
+        self._name_hook = None
+        self._ready = Event()
+        
+        # The hook must be installed and pumped on the same thread
+        self._thread = Thread(target=self._pump_messages, daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        
+        if self.running:
+            logger.info("Foreground window watcher started")
+        else:
+            logger.warning(f"Foreground window watcher unavailable, polling every {POLL_INTERVAL} seconds")
+    
+    def _pump_messages(self):
+        """Install the WinEvent hooks and run a message loop so their callbacks get delivered"""
+        try:
+            # Keep a reference so the callback is not garbage collected while the hooks are installed
+            self._callback = WinEventProc(self.on_win_event)
+            hook = _user32.SetWinEventHook(EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND, None,
+                                           self._callback, 0, 0, WINEVENT_OUTOFCONTEXT)
+            self._thread_id = _kernel32.GetCurrentThreadId()
+            self.running = bool(hook)
+            if self.running:
+                self.hook_name_changes(_get_foreground_window())
+        except Exception as e:
+            logger.error(f"Error installing foreground window hook: {str(e)}")
+            self.running = False
+        finally:
+            self._ready.set()
+        
+        if not self.running:
+            return
+        
+        msg = wintypes.MSG()
+        while _user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            _user32.TranslateMessage(ctypes.byref(msg))
+            _user32.DispatchMessageW(ctypes.byref(msg))
+        
+        if self._name_hook:
+            _user32.UnhookWinEvent(self._name_hook)
+        _user32.UnhookWinEvent(hook)
+        self.running = False
+    
+    def hook_name_changes(self, hwnd):
+        """Listen for title changes in the process owning hwnd if it is KiCad, replacing the previous hook"""
+        if self._name_hook:
+            _user32.UnhookWinEvent(self._name_hook)
+            self._name_hook = None
+        if not hwnd:
+            return
+        
+        _, pid = _get_window_thread_process_id(hwnd)
+        if not pid:
+            return  # pid 0 would hook every process
+        
+        # Title changes only matter for KiCad; other applications would flood the callback
+        exe_name = _exe_name(pid)
+        if exe_name is None or not any(k in exe_name.lower() for k in _KICAD_EXE_KEYS):
+            return
+        self._name_hook = _user32.SetWinEventHook(EVENT_OBJECT_NAMECHANGE, EVENT_OBJECT_NAMECHANGE, None,
+                                                  self._callback, pid, 0, WINEVENT_OUTOFCONTEXT)
+    
+    @property
+    def watching_titles(self):
+        """Whether title changes of the foreground window are being reported"""
+        return bool(self._name_hook)
+    
+    def on_win_event(self, hook, event, hwnd, id_object, id_child, event_thread, event_time):
+        """Callback for foreground changes and title changes of the foreground window"""
+        if event == EVENT_SYSTEM_FOREGROUND:
+            # Runs on the message loop thread, so the name change hook can be moved here
+            try:
+                self.hook_name_changes(hwnd)
+            except Exception as e:
+                logger.error(f"Error hooking window title changes: {str(e)}")
+            self.changed.set()
+        elif event == EVENT_OBJECT_NAMECHANGE and id_object == OBJID_WINDOW and hwnd == _get_foreground_window():
+            # e.g. another board opened in the same pcbnew window
+            self.changed.set()
+    
+    def wait(self, timeout):
+        """Block until the foreground window or its title changes, or timeout seconds pass"""
+        deadline = time.monotonic() + timeout
+        # Wait in short slices so Ctrl+C is still handled promptly on Windows
+        while not self.changed.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.changed.wait(min(remaining, 1))
+        self.changed.clear()
+    
+    def stop(self):
+        """Remove the hook and end the message loop"""
+        if self.running and self._thread_id:
+            _user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+            logger.info("Foreground window watcher stopped")
 
 class KiCadWakaTime:
     def __init__(self, dry_run=False, inactivity_threshold=60):
         self.last_heartbeat_at = 0
         self.last_file = None
         self.heartbeat_frequency = 60  # seconds
+        self.flush_frequency = 120  # seconds between CLI runs while the same file stays focused
+        self.last_flush_at = 0
+        self.idle_ticks = 0  # main loop iterations since KiCad was last focused
+        self._pending = []  # heartbeat records not yet handed to the worker
         self.dry_run = dry_run
         
         # Initialize activity tracker
@@ -109,34 +379,52 @@ class KiCadWakaTime:
         if dry_run:
             logger.info("Running in dry run mode - no heartbeats will be sent")
         
-        # Find wakatime CLI using glob pattern
-        home_dir = str(Path.home())
-        wakatime_path = os.path.join(home_dir, '.wakatime')
-        
-        # Look for wakatime-cli with any extension
-        cli_pattern = os.path.join(wakatime_path, 'wakatime-cli*')
-        cli_candidates = glob.glob(cli_pattern)
-        
-        if cli_candidates:
-            self.wakatime_cli = cli_candidates[0]  # Use the first match
-            logger.info(f"Found WakaTime CLI: {self.wakatime_cli}")
-        else:
-            logger.error("WakaTime CLI not found in ~/.wakatime/")
+        # Find wakatime CLI once; it is only looked up again if launching it fails
+        self.wakatime_cli = self.find_wakatime_cli()
+        if not self.wakatime_cli:
             raise Exception("WakaTime CLI not found. Please make sure it's installed in ~/.wakatime/")
+        self._wakatime_cli_ok = True
         
         # Load WakaTime config
         self.load_wakatime_config()
         
+        # Locate the KiCad config up front; its parsed contents are cached by mtime
+        self.kicad_config_path = self.find_kicad_config()
+        self._kicad_config_searched_at = time.monotonic()
+        self._kicad_config_cache = None  # (mtime, parsed kicad.json)
+        self._prj_dir_cache = {}  # project name -> project directory
+        self._pid_name_cache = {}  # (pid, hwnd) -> lowercase executable name
+        self._last_title, self._last_parsed = None, None  # last window title and its parse result
+        
+        # Heartbeats are handed to a single worker thread so the main loop never waits on the CLI
+        self._heartbeat_queue = queue.Queue()  # lists of heartbeat records, or None to stop
+        self._heartbeat_worker = Thread(target=self.process_heartbeats, daemon=True)
+        self._heartbeat_worker.start()
+        
         logger.info("KiCad WakaTime initialized")
         logger.info(f"WakaTime CLI path: {self.wakatime_cli}")
 
-    def get_curr_prj_dir(self, project_name: str):
-        """Read from %appdata%/kicad\\9.0\\kicad.json and find the project directory using the project name and json.system.file_history"""
-        import json
+    def find_wakatime_cli(self):
+        """Locate wakatime-cli in ~/.wakatime/, returning its path or None"""
+        # Look for wakatime-cli with any extension
+        try:
+            with os.scandir(_WAKATIME_DIR) as it:
+                cli_candidates = [e.path for e in it if e.name.startswith('wakatime-cli') and e.is_file()]
+        except OSError:
+            cli_candidates = []
         
+        if cli_candidates:
+            logger.info(f"Found WakaTime CLI: {cli_candidates[0]}")
+            return cli_candidates[0]  # Use the first match
+        
+        logger.error("WakaTime CLI not found in ~/.wakatime/")
+        return None
+
+    def find_kicad_config(self):
+        """Locate %appdata%/kicad/<version>/kicad.json, preferring the newest KiCad version"""
         try:
             # Determine config directory based on OS
-            if platform.system() == 'Windows':
+            if _IS_WINDOWS:
                 appdata = os.environ.get('APPDATA')
                 if appdata is None:
                     raise Exception("APPDATA environment variable not found")
@@ -149,26 +437,56 @@ class KiCadWakaTime:
                 return None
             
             # Try to find the KiCad config in different version folders
-            kicad_config = None
             version_dirs = ['9.0', '8.0', '7.0', '6.0']
             
             for version in version_dirs:
-                version_dir = os.path.join(config_dir, version)
-                if os.path.exists(version_dir):
-                    for config_file in ['kicad.json']:
-                        config_path = os.path.join(version_dir, config_file)
-                        if os.path.exists(config_path):
-                            logger.debug(f"Found KiCad config at {config_path}")
-                            with open(config_path, 'r') as f:
-                                kicad_config = json.load(f)
-                                break
-                    if kicad_config:
-                        break
+                config_path = os.path.join(config_dir, version, 'kicad.json')
+                if os.path.exists(config_path):
+                    logger.debug(f"Found KiCad config at {config_path}")
+                    return config_path
             
-            if not kicad_config:
-                logger.warning(f"Could not find KiCad config in {config_dir} for versions {version_dirs}")
-                return None
+            logger.warning(f"Could not find KiCad config in {config_dir} for versions {version_dirs}")
+            return None
+        
+        except Exception as e:
+            logger.error(f"Error locating KiCad config: {str(e)}")
+            return None
+
+    def relocate_kicad_config(self):
+        """Search for kicad.json again, at most once every KICAD_CONFIG_RETRY_INTERVAL seconds"""
+        now = time.monotonic()
+        if now - self._kicad_config_searched_at >= KICAD_CONFIG_RETRY_INTERVAL:
+            self._kicad_config_searched_at = now
+            self.kicad_config_path = self.find_kicad_config()
+        return self.kicad_config_path
+
+    def get_curr_prj_dir(self, project_name: str):
+        """Read from %appdata%/kicad\\9.0\\kicad.json and find the project directory using the project name and json.system.file_history"""
+        if self.kicad_config_path is None and self.relocate_kicad_config() is None:
+            return None
+        
+        try:
+            # Only re-parse kicad.json when it has been modified since the last read
+            try:
+                mtime = os.stat(self.kicad_config_path).st_mtime
+            except OSError:
+                # The config was moved or removed; drop the caches and look for it again
+                self.kicad_config_path = None
+                self._kicad_config_cache = None
+                self._prj_dir_cache.clear()
+                if self.relocate_kicad_config() is None:
+                    raise
+                mtime = os.stat(self.kicad_config_path).st_mtime
             
+            if self._kicad_config_cache is None or self._kicad_config_cache[0] != mtime:
+                with open(self.kicad_config_path, 'r') as f:
+                    self._kicad_config_cache = (mtime, json.load(f))
+                self._prj_dir_cache.clear()
+            
+            if project_name in self._prj_dir_cache:
+                return self._prj_dir_cache[project_name]
+            
+            kicad_config = self._kicad_config_cache[1]
             prj_file:str = kicad_config["system"]["open_projects"][0]
 
             # Verify that the project name appears in the project file path
@@ -176,6 +494,7 @@ class KiCadWakaTime:
                 # Extract the directory containing the project file
                 prj_dir = os.path.dirname(prj_file)
                 logger.debug(f"Project directory found: {prj_dir}")
+                self._prj_dir_cache[project_name] = prj_dir
                 return prj_dir
             else:
                 logger.warning(f"Project name '{project_name}' not found in project file path '{prj_file}'")
@@ -188,11 +507,14 @@ class KiCadWakaTime:
 
     def load_wakatime_config(self):
         """Load API key and URL from ~/.wakatime.cfg"""
-        config = configparser.ConfigParser()
-        config_file = os.path.expanduser('~/.wakatime.cfg')
+        # WakaTime values are used verbatim, so skip '%' interpolation
+        config = configparser.ConfigParser(interpolation=None)
+        config_file = _WAKATIME_CFG
         
         try:
-            config.read(config_file)
+            # read_file() fails immediately if the config is missing, unlike read()
+            with open(config_file, 'r') as f:
+                config.read_file(f)
             self.api_key = config.get('settings', 'api_key')
             
             # API URL is optional, use default if not specified
@@ -206,74 +528,107 @@ class KiCadWakaTime:
             logger.error(f"Error loading WakaTime config: {str(e)}")
             raise Exception(f"Could not load WakaTime configuration: {str(e)}")
 
+    def _exe_name_for_pid(self, pid: int, hwnd: int):
+        """Return the lowercase executable name for pid, or None if it cannot be queried"""
+        # A window belongs to one process for its whole life, so (pid, hwnd) cannot go stale
+        # when Windows reuses the pid of an exited process for an unrelated one
+        key = (pid, hwnd)
+        exe_name = self._pid_name_cache.get(key)
+        if exe_name is not None:
+            return exe_name
+        
+        exe_name = _exe_name(pid)
+        if exe_name is None:
+            return None  # Process exited or cannot be opened; failures are not cached
+        exe_name = exe_name.lower()
+        
+        # Keep the cache bounded; focused windows rarely change so a full reset is cheap
+        if len(self._pid_name_cache) >= PID_NAME_CACHE_SIZE:
+            self._pid_name_cache.clear()
+        self._pid_name_cache[key] = exe_name
+        return exe_name
+
     def get_active_kicad_window(self):
         """Get the active KiCad window title and extract file path by checking both window title and executable name"""
         try:
-            if platform.system() == 'Windows':
-                from win32 import win32gui, win32process
-                
-                window = win32gui.GetForegroundWindow()
-                window_title = win32gui.GetWindowText(window)
-                
-                # Get process ID and executable name
-                _, pid = win32process.GetWindowThreadProcessId(window)
-                try:
-                    process = psutil.Process(pid)
-                    exe_name = process.name().lower()
-                    is_kicad_exe = any(k in exe_name for k in ['kicad', 'pcbnew', 'eeschema', 'pcb_editor', 'sch_editor'])
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    is_kicad_exe = False
+            if not _IS_WINDOWS:
+                return None
+            
+            window = _get_foreground_window()
+            window_title = _get_window_text(window)
+            
+            # An unchanged title parses to the same result, so reuse the last one
+            if window_title == self._last_title:
+                return self._last_parsed
+            self._last_title, self._last_parsed = window_title, None
+            
+            # Titles in neither format can never be parsed, so skip all further checks
+            has_new_format = '—' in window_title
+            has_old_format = '.kicad_' in window_title or '.sch' in window_title
+            if not has_new_format and not has_old_format:
+                return None
+            
+            # Get process ID and executable name
+            _, pid = _get_window_thread_process_id(window)
+            exe_name = self._exe_name_for_pid(pid, window)
+            is_kicad_exe = exe_name is not None and any(k in exe_name for k in _KICAD_EXE_KEYS)
             
             # Check if it's a KiCad window based on title or executable
-            is_kicad_title = any(k in window_title for k in ['KiCad', 'PCB Editor', 'Eeschema', 'Schematic Editor', 'PCBNew', 'Symbol Editor', 'Footprint Editor'])
+            is_kicad_title = any(k in window_title for k in _KICAD_TITLE_KEYS)
             
             if is_kicad_title or is_kicad_exe:
-                logger.debug(f"KiCad detected - Title match: {is_kicad_title}, Exe match: {is_kicad_exe}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("KiCad detected - Title match: %s, Exe match: %s", is_kicad_title, is_kicad_exe)
                 
                 # First try the old format pattern
-                old_format = re.search(r'([^\s/\\]+\.(kicad_pcb|sch|kicad_sch|kicad_pro))(?:\s+-\s+|\s+\[\*\]\s+-\s+)', window_title)
+                old_format = _OLD_FORMAT_RE.search(window_title) if has_old_format else None
                 if old_format:
                     filename = old_format.group(1)
                     # Extract project name from filename (remove extension)
                     project_name = os.path.splitext(filename)[0]
-                    return (filename, project_name)
+                    self._last_parsed = (filename, project_name)
+                    return self._last_parsed
                 
                 # Try new format: "{if unsaved: * else ""} {project name} — {editor type}"
-                new_format = re.search(r'(\*?)([^\s—]+)\s+—\s+(.+)', window_title)
+                new_format = _NEW_FORMAT_RE.search(window_title) if has_new_format else None
                 if new_format:
                     is_unsaved = new_format.group(1) == '*'
                     project_name = new_format.group(2).strip()
                     editor_type = new_format.group(3).strip()
 
-                    file_path = str(self.get_curr_prj_dir(project_name)) + "\\" + project_name
+                    prj_dir = self.get_curr_prj_dir(project_name)
+                    if prj_dir is None:
+                        # Look the title up again once kicad.json lists the project
+                        self._last_title = None
+                    file_path = str(prj_dir) + "\\" + project_name
                     
                     # Map editor type to file extension
-                    if 'PCB Editor' in editor_type:
-                        file_path = f"{file_path}.kicad_pcb"
-                    elif 'Schematic Editor' in editor_type:
-                        file_path = f"{file_path}.kicad_sch"
-                    elif 'KiCad' in editor_type:
-                        file_path = f"{file_path}.kicad_pro"
-                    elif 'Symbol Editor' in editor_type:
-                        logger.warning("Symbol Editor detected file path may not be correct")
-                        file_path = f"{file_path}.kicad_sym"
-                    elif 'Footprint Editor' in editor_type:
-                        logger.warning("Footprint Editor detected file path may not be correct")
-                        file_path = f"{file_path}.kicad_mod"
-
-                    return (file_path, project_name)
+                    for editor, ext in _EXT_MAP:
+                        if editor in editor_type:
+                            if editor in _APPROX_PATH_EDITORS:
+                                logger.warning(f"{editor} detected file path may not be correct")
+                            file_path = f"{file_path}{ext}"
+                            break
+
+                    self._last_parsed = (file_path, project_name)
+                    return self._last_parsed
                 
             
             return None
         except Exception as e:
             logger.error(f"Error getting active window: {str(e)}")
+            self._last_title = None
             return None
 
     def send_heartbeat(self, file_info: tuple):
         """Send heartbeat data to WakaTime"""
-        if not os.path.exists(self.wakatime_cli) and not self.dry_run:
-            logger.error(f"WakaTime CLI not found at {self.wakatime_cli}")
-            return
+        if not self._wakatime_cli_ok and not self.dry_run:
+            # Retry discovery in case the CLI was reinstalled since the last failure
+            cli_path = self.find_wakatime_cli()
+            if not cli_path:
+                return
+            self.wakatime_cli = cli_path
+            self._wakatime_cli_ok = True
         
         file, project_name = file_info
         
@@ -283,53 +638,156 @@ class KiCadWakaTime:
         # Only send heartbeat if:
         # 1. The file changed, OR
         # 2. Time since last heartbeat exceeds frequency AND user is active
-        if (file != self.last_file) or (now - self.last_heartbeat_at > self.heartbeat_frequency and is_user_active):
+        file_changed = file != self.last_file
+        if file_changed or (now - self.last_heartbeat_at > self.heartbeat_frequency and is_user_active):
             self.last_heartbeat_at = now
             self.last_file = file
             
-            cmd = [
-                self.wakatime_cli,
-                '--entity', file,
-                '--plugin', 'kicad-wakatime/0.1.0',
-                '--project', project_name,
-                '--language', 'KiCad',
-                '--key', self.api_key
-            ]
-            
-            if self.api_url:
-                cmd.extend(['--api-url', self.api_url])
-            
-            if self.dry_run:
-                logger.info(f"DRY RUN: Would send heartbeat for {file}")
-                logger.info(f"DRY RUN: Command: {' '.join(cmd)}")
-            else:
+            if not self.dry_run:
                 activity_status = "ACTIVE" if is_user_active else "INACTIVE"
                 seconds_since_activity = self.activity_tracker.get_time_since_activity()
-                logger.info(f"Sending heartbeat for file: {file} (User: {activity_status}, {seconds_since_activity:.1f}s since activity)")
-                try:
-                    subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    logger.info(f"Heartbeat sent for {file}")
-                except Exception as e:
-                    logger.error(f"Error sending heartbeat: {str(e)}")
+                logger.info(f"Recording heartbeat for file: {file} (User: {activity_status}, {seconds_since_activity:.1f}s since activity)")
+            self._pending.append({'entity': file, 'project': project_name, 'language': 'KiCad', 'time': now})
+            
+            # Heartbeats for the same file are buffered; a new file is sent right away
+            if file_changed:
+                self.flush_heartbeats()
         elif not is_user_active:
             logger.debug(f"Skipping heartbeat: User inactive for {self.activity_tracker.get_time_since_activity():.1f}s")
+            # No more heartbeats until the user is back, so don't hold the buffered ones
+            self.flush_heartbeats()
+
+    def flush_heartbeats(self):
+        """Hand all buffered heartbeats to the worker thread"""
+        self.last_flush_at = time.time()
+        if self._pending:
+            self._heartbeat_queue.put(self._pending)
+            self._pending = []
+
+    def process_heartbeats(self):
+        """Worker thread: send queued heartbeats, batching any that piled up into one CLI call"""
+        while True:
+            flushes = [self._heartbeat_queue.get()]
+            # Drain everything queued while the previous CLI call was running
+            while True:
+                try:
+                    flushes.append(self._heartbeat_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            stop = None in flushes
+            batch = [heartbeat for flush in flushes if flush is not None for heartbeat in flush]
+            if batch:
+                self.send_heartbeats(batch)
+            if stop:
+                return
+
+    def send_heartbeats(self, batch: list):
+        """Run wakatime-cli once for a batch of heartbeat records"""
+        # The newest heartbeat goes on the command line, the rest through --extra-heartbeats on stdin
+        heartbeat = batch[-1]
+        file = heartbeat['entity']
+        extra_heartbeats = batch[:-1]
+        
+        cmd = [
+            self.wakatime_cli,
+            '--entity', file,
+            '--plugin', 'kicad-wakatime/0.1.0',
+            '--project', heartbeat['project'],
+            '--language', heartbeat['language'],
+            '--time', str(heartbeat['time']),
+            '--key', self.api_key
+        ]
+        
+        if self.api_url:
+            cmd.extend(['--api-url', self.api_url])
+        
+        if extra_heartbeats:
+            cmd.append('--extra-heartbeats')
+        
+        if self.dry_run:
+            logger.info(f"DRY RUN: Would send heartbeat for {file}")
+            if extra_heartbeats:
+                logger.info(f"DRY RUN: Would send {len(extra_heartbeats)} extra heartbeats")
+            logger.info(f"DRY RUN: Command: {' '.join(cmd)}")
+            return
+        
+        try:
+            # Only capture CLI output when it will actually be logged
+            output = subprocess.PIPE if logger.isEnabledFor(logging.DEBUG) else subprocess.DEVNULL
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE if extra_heartbeats else None,
+                                       stdout=output, stderr=output)
+            stdout, stderr = process.communicate(json.dumps(extra_heartbeats).encode() if extra_heartbeats else None)
+            if process.returncode != 0:
+                logger.error(f"WakaTime CLI exited with code {process.returncode}")
+                if stderr or stdout:
+                    logger.debug(f"WakaTime CLI output: {(stderr or stdout).decode(errors='replace').strip()}")
+                return
+            logger.info(f"Heartbeat sent for {file}" + (f" with {len(extra_heartbeats)} extra heartbeats" if extra_heartbeats else ""))
+        except OSError as e:
+            logger.error(f"Error sending heartbeat: {str(e)}")
+            # The CLI may have been moved or updated, look for it again
+            cli_path = self.find_wakatime_cli()
+            self._wakatime_cli_ok = cli_path is not None
+            if cli_path:
+                self.wakatime_cli = cli_path
+        except Exception as e:
+            logger.error(f"Error sending heartbeat: {str(e)}")
+
+    def stop_heartbeats(self, timeout=10):
+        """Let the worker send any buffered or queued heartbeats, then stop it"""
+        self.flush_heartbeats()
+        self._heartbeat_queue.put(None)
+        self._heartbeat_worker.join(timeout)
+
+    def next_check_delay(self, active_file):
+        """Seconds to wait for a focus change before re-checking the active window"""
+        if not active_file:
+            return self.heartbeat_frequency
+        
+        # Wake up just after the next heartbeat for the focused file is due
+        due_in = self.last_heartbeat_at + self.heartbeat_frequency - time.time()
+        return due_in + 1 if due_in > 0 else POLL_INTERVAL
 
     def run(self):
         print("Starting KiCad WakaTime integration...")
         """Main loop to monitor KiCad activity"""
         logger.info("Starting KiCad WakaTime monitor")
+        watcher = ForegroundWindowWatcher() if _IS_WINDOWS else None
         try:
             while True:
                 active_file = self.get_active_kicad_window()
                 if active_file:
+                    self.idle_ticks = 0
+                    self.activity_tracker.start()
                     self.send_heartbeat(active_file)
-                time.sleep(5)  # Check every 5 seconds
+                else:
+                    # KiCad lost focus; send what is buffered instead of waiting for the next heartbeat
+                    self.flush_heartbeats()
+                    # Detach the global input hooks while another application is in use
+                    self.idle_ticks += 1
+                    if self.idle_ticks > 1:
+                        self.activity_tracker.stop()
+                
+                if time.time() - self.last_flush_at >= self.flush_frequency:
+                    self.flush_heartbeats()
+                if watcher and watcher.running:
+                    delay = self.next_check_delay(active_file)
+                    if active_file and not watcher.watching_titles:
+                        # Title changes inside the focused window would go unnoticed, so keep polling
+                        delay = min(delay, POLL_INTERVAL)
+                    watcher.wait(delay)
+                else:
+                    time.sleep(POLL_INTERVAL)
         except KeyboardInterrupt:
             logger.info("KiCad WakaTime monitor stopped")
-            self.activity_tracker.stop()
         except Exception as e:
             logger.error(f"Error in main loop: {str(e)}")
+        finally:
+            if watcher:
+                watcher.stop()
             self.activity_tracker.stop()
+            self.stop_heartbeats()
 
 if __name__ == "__main__":
     try:
@@ -375,10 +833,9 @@ if __name__ == "__main__":
         
         # File handler (if not disabled)
         if not args.no_file_log:
-            log_dir = os.path.expanduser('~/.wakatime')
-            os.makedirs(log_dir, exist_ok=True)
-            log_file = os.path.join(log_dir, 'kicad-wakatime.log')
-            file_handler = logging.FileHandler(log_file)
+            os.makedirs(_WAKATIME_DIR, exist_ok=True)
+            log_file = _LOG_PATH
+            file_handler = BufferedFileHandler(log_file)
             file_handler.setFormatter(file_formatter)
             file_handler.setLevel(log_level)
             handlers.append(file_handler)
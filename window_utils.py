@@ -8,11 +8,18 @@ def list_open_windows():
     Returns:
         list: A list of window titles as strings
     """
+    # Local names avoid a module attribute lookup for every enumerated window
+    is_window_visible = win32gui.IsWindowVisible
+    get_window_text_length = win32gui.GetWindowTextLength
+    get_window_text = win32gui.GetWindowText
+    
     def enum_windows_callback(hwnd, window_list):
-        if win32gui.IsWindowVisible(hwnd):
-            window_title = win32gui.GetWindowText(hwnd)
-            if window_title:
-                window_list.append(window_title)
+        # Check visibility and title length before allocating the title string
+        if not is_window_visible(hwnd) or not get_window_text_length(hwnd):
+            return True
+        window_title = get_window_text(hwnd)
+        if window_title:
+            window_list.append(window_title)
         return True
     
     windows = []